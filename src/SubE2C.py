@@ -1,96 +1,386 @@
 import re
 import os
 import sys
+import asyncio
+import argparse
+import hashlib
+import json
 import logging
+import random
 import time
-from anthropic import Anthropic
+import itertools
+from anthropic import (AsyncAnthropic, AuthenticationError, DefaultAsyncHttpxClient,
+                       PermissionDeniedError, RateLimitError)
+from anthropic.types import Message
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Awaitable, Dict, List, Optional, TextIO, TypeVar
 import srt
+import charset_normalizer
+from tqdm import tqdm
+from tqdm.contrib.logging import logging_redirect_tqdm
 
+# Works both when run as a script from src/ and when imported as src.SubE2C
+try:
+    from .cache import DEFAULT_CACHE_PATH, TranslationCache
+except ImportError:
+    from cache import DEFAULT_CACHE_PATH, TranslationCache
 
-def process_srt_file(input_path: str, output_path: str, client: Anthropic) -> bool:
+MODEL = "claude-3-haiku-20240307"
+MAX_OUTPUT_TOKENS = 4096
+
+# Well-formed Anthropic API keys, trusted without a test request
+API_KEY_RE = re.compile(r"sk-ant-[A-Za-z0-9_\-]{80,}")
+
+# Instructions are sent as the system prompt so each request only carries the subtitle text
+TRANSLATE_PROMPT = "Translate English to Traditional Chinese (zh-tw). Output only the translation."
+
+# Subtitle blocks are packed into windows so each API request translates many of them
+BATCH_SIZE = 25
+BATCH_CHARS = 4000
+BATCH_SEPARATOR = "%%"
+TRANSLATE_BATCH_PROMPT = (
+    "Translate each numbered English subtitle to Traditional Chinese (zh-tw). "
+    "Output only the translations, in the same order, without the numbers, "
+    f"separated by a line containing only {BATCH_SEPARATOR}."
+)
+# Numbering the model may echo in front of a batched translation, e.g. "3. "
+NUMBER_PREFIX_RE = re.compile(r"^(\d+)\.\s*")
+
+# Subtitles containing CJK characters are considered translated when resuming
+CJK_RE = re.compile(r"[\u3400-\u9fff]")
+# Output is flushed to disk every this many blocks, bounding the work lost on a crash
+CHECKPOINT_INTERVAL = 20
+
+# Files with at least this many blocks may be sent through the Message Batches API,
+# smaller ones finish faster in realtime
+BATCH_API_MIN_BLOCKS = 50
+BATCH_API_POLL_INTERVAL = 30
+
+# Maximum number of API requests in flight at once
+MAX_CONCURRENCY = 10
+
+# Exponential backoff between retries, in seconds
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+# Errors other than rate limits rarely go away on their own, so give up sooner
+MAX_ERROR_RETRIES = 2
+# Errors that no retry can fix, such as a rejected API key
+FATAL_API_ERRORS = (AuthenticationError, PermissionDeniedError)
+
+T = TypeVar("T")
+
+
+class ClientPool:
     """
-    Process and translate SRT file from English to Traditional Chinese
+    Round-robin pool of Anthropic clients, one per API key
+
+    Clients that hit a rate limit are skipped until their cooldown expires.
+    Keys that keep getting rate limited cool down for longer each time.
+    """
+
+    def __init__(self, clients: List[AsyncAnthropic]):
+        self.clients = clients
+        self.cycle = itertools.cycle(clients)
+        self.cooldowns = {}  # Client -> time.monotonic() when it may be used again
+        self.rate_limits = {}  # Client -> consecutive rate limit responses
+
+    def next(self) -> AsyncAnthropic:
+        """
+        Return the next client that is not cooling down
+
+        If every client is cooling down, the one available soonest is returned.
+        """
+        now = time.monotonic()
+        for _ in range(len(self.clients)):
+            client = next(self.cycle)
+            if self.cooldowns.get(client, 0) <= now:
+                return client
+        return min(self.clients, key=lambda client: self.cooldowns.get(client, 0))
+
+    def cool_down(self, client: AsyncAnthropic, delay: float) -> None:
+        """
+        Skip a rate limited client for at least the given number of seconds
+
+        The cooldown doubles with every consecutive rate limit of the same client.
+        """
+        strikes = self.rate_limits.get(client, 0) + 1
+        self.rate_limits[client] = strikes
+        delay = max(delay, min(RETRY_MAX_DELAY, delay * 2 ** (strikes - 1)))
+        logging.warning(f"API key {self.clients.index(client) + 1} rate limited "
+                        f"{strikes} time(s) in a row, cooling down for {delay:.0f}s")
+        self.cooldowns[client] = time.monotonic() + delay
+
+    def succeeded(self, client: AsyncAnthropic) -> None:
+        """
+        Reset the rate limit count of a client after a successful request
+        """
+        self.rate_limits.pop(client, None)
+
+    def wait_time(self) -> float:
+        """
+        Return how many seconds until any client is available again
+        """
+        now = time.monotonic()
+        return max(0.0, min(self.cooldowns.get(client, 0) for client in self.clients) - now)
+
+def make_batches(texts: List[str], batch_size: int = BATCH_SIZE,
+                 batch_chars: int = BATCH_CHARS) -> List[List[int]]:
+    """
+    Group texts into windows that are translated with a single API request
 
     Args:
-        input_path (str): Path to input SRT file
+        texts (List[str]): Texts to group
+        batch_size (int): Maximum number of texts per window
+        batch_chars (int): Maximum number of characters per window
+
+    Returns:
+        List[List[int]]: Indices into texts for each window, in order
+    """
+    windows = []
+    window = []
+    chars = 0
+
+    for i, text in enumerate(texts):
+        if window and (len(window) >= batch_size or chars + len(text) > batch_chars):
+            windows.append(window)
+            window = []
+            chars = 0
+        window.append(i)
+        chars += len(text)
+
+    if window:
+        windows.append(window)
+
+    return windows
+
+async def bounded(semaphore: asyncio.Semaphore, coro: Awaitable[T]) -> T:
+    """
+    Await a coroutine while holding a slot of the semaphore
+    """
+    async with semaphore:
+        return await coro
+
+async def write_in_order(outfile: TextIO, queue: asyncio.Queue, total_blocks: int) -> None:
+    """
+    Write translated subtitles to the output file in their original order
+
+    Subtitles may finish out of order, so they are held back until every
+    subtitle before them has been written.
+
+    Args:
+        outfile (TextIO): Output SRT file
+        queue (asyncio.Queue): Queue of (index, subtitle) pairs
+        total_blocks (int): Number of subtitles to write
+    """
+    pending = {}
+    next_index = 0
+
+    while next_index < total_blocks:
+        i, subtitle = await queue.get()
+        pending[i] = subtitle
+        while next_index in pending:
+            outfile.write(pending.pop(next_index).to_srt())
+            next_index += 1
+
+def is_translated(text: str) -> bool:
+    """
+    Check whether a subtitle text already contains Chinese characters
+    """
+    return CJK_RE.search(text) is not None
+
+def load_checkpoint(progress_path: str) -> Dict[int, srt.Subtitle]:
+    """
+    Load subtitles already translated by an earlier, interrupted run
+
+    The progress file is a journal that translated blocks are appended to
+    as they finish, so later entries win. A block cut off mid-write at its
+    end is removed from the file, so new blocks can be appended after it.
+
+    Args:
+        progress_path (str): Path to the progress file of the output SRT file
+
+    Returns:
+        Dict[int, srt.Subtitle]: Translated subtitles keyed by subtitle number
+    """
+    checkpoint = {}
+    if not os.path.exists(progress_path):
+        return checkpoint
+
+    with open(progress_path, 'rb') as f:
+        raw = f.read()
+
+    # Every block ends with a blank line, anything after the last one was cut off mid-write
+    end = raw.rfind(b"\n\n")
+    raw = raw[:end + 2] if end != -1 else b""
+    with open(progress_path, 'r+b') as f:
+        f.truncate(len(raw))
+
+    try:
+        for sub in srt.parse(raw.decode('utf-8', errors='replace')):
+            if is_translated(sub.content):
+                checkpoint[sub.index] = sub
+    except srt.SRTParseError as e:
+        logging.warning(f"Could not fully read checkpoint {progress_path}: {str(e)}")
+
+    return checkpoint
+
+async def process_srt_file(subtitles: List[srt.Subtitle], output_path: str, pool: ClientPool,
+                           batch_size: int = BATCH_SIZE, batch_chars: int = BATCH_CHARS,
+                           max_concurrency: int = MAX_CONCURRENCY,
+                           cache: Optional[TranslationCache] = None,
+                           mode: str = "realtime", resume: bool = True) -> bool:
+    """
+    Translate parsed SRT subtitles from English to Traditional Chinese and write them out
+
+    Args:
+        subtitles (List[srt.Subtitle]): Subtitles parsed from the input SRT file
         output_path (str): Path to output SRT file
-        client (Anthropic): Anthropic client object
+        pool (ClientPool): Pool of Anthropic clients
+        batch_size (int): Maximum number of subtitle blocks per API request
+        batch_chars (int): Maximum number of characters per API request
+        max_concurrency (int): Maximum number of API requests in flight
+        cache (Optional[TranslationCache]): Cache of previous translations
+        mode (str): "realtime" to call the API directly, "batch" to submit
+            files of at least BATCH_API_MIN_BLOCKS blocks as one Message Batch
+        resume (bool): Reuse blocks translated by an interrupted run of the same output file,
+            recorded in <output>.progress
 
     Returns:
         bool: True if successful, False if failed
     """
     try:
-        # Try different encodings if UTF-8 fails
-        encodings = ['utf-8', 'utf-8-sig', 'cp1252', 'latin-1']
-        content = None
+        total_blocks = len(subtitles)
 
-        for encoding in encodings:
-            try:
-                with open(input_path, 'r', encoding=encoding) as infile:
-                    content = infile.read()
-                break
-            except UnicodeDecodeError:
-                continue
+        # Blocks translated by an earlier, interrupted run are kept as is
+        progress_path = output_path + ".progress"
+        checkpoint = load_checkpoint(progress_path) if resume else {}
+        resumed = []
+        # Subtitles without text have nothing to translate and are written as is
+        unchanged = []
 
-        if content is None:
-            raise ValueError("Could not decode the subtitle file with any supported encoding")
+        # Recurring lines are translated once and fanned out to every block using them
+        unique = {}
+        for i, sub in enumerate(subtitles):
+            previous = checkpoint.get(sub.index)
+            if not sub.content.strip():
+                unchanged.append(i)
+            elif previous is not None and (previous.start, previous.end) == (sub.start, sub.end):
+                sub.content = previous.content
+                resumed.append(i)
+            else:
+                unique.setdefault(sub.content, []).append(i)
+        texts = list(unique)
 
-        # Split into subtitle blocks and filter empty blocks
-        blocks = [block.strip() for block in re.split(r'\n\n+', content.strip()) if block.strip()]
-        translated_blocks = []
-        total_blocks = len(blocks)
+        use_batch_api = mode == "batch" and len(texts) >= BATCH_API_MIN_BLOCKS
+        if use_batch_api:
+            windows = []
+        else:
+            windows = make_batches(texts, batch_size, batch_chars)
 
         print("\nStarting translation process...")
-        print(f"Total subtitle blocks to translate: {total_blocks}")
+        print(f"Total subtitle blocks to translate: {total_blocks} ({len(texts)} unique)")
+        if resumed:
+            print(f"Resuming: {len(resumed)} blocks already translated")
+        if use_batch_api:
+            print("Submitting all blocks through the Message Batches API")
+        else:
+            if mode == "batch":
+                print(f"Fewer than {BATCH_API_MIN_BLOCKS} unique texts, translating in realtime instead")
+            print(f"Total API requests: {len(windows)}")
 
-        for i, block in enumerate(blocks, 1):
-            try:
-                # Split block into components
-                lines = block.split('\n')
-                if len(lines) < 3:
-                    print(f"\nWarning: Block {i} has invalid format, skipping...")
-                    translated_blocks.append(block)  # Keep original
-                    continue
+        semaphore = asyncio.Semaphore(max_concurrency)
+        queue = asyncio.Queue()
+        progress = tqdm(total=total_blocks, unit="block")
+
+        for i in resumed + unchanged:
+            queue.put_nowait((i, subtitles[i]))
+        progress.update(len(resumed) + len(unchanged))
+
+        checkpointed = 0
 
-                # Extract components
-                subtitle_number = lines[0]
-                timestamp = lines[1]
-                text_content = '\n'.join(lines[2:])  # Preserve multi-line subtitles
+        def record_progress(subtitle: srt.Subtitle) -> None:
+            nonlocal checkpointed
+            # Journal the block right away, independent of output order
+            journal.write(subtitle.to_srt())
+            checkpointed += 1
 
-                print(f"\nTranslating block {i}/{total_blocks}")
-                print(f"Original text: {text_content}")
+            # Make progress durable so an interrupted run can resume from it
+            if checkpointed % CHECKPOINT_INTERVAL == 0:
+                journal.flush()
+                os.fsync(journal.fileno())
 
-                # Translate text content
-                translated_text = translate_text(client, text_content)
+        def apply_translations(window_texts: List[str], translations: List[Optional[str]]) -> None:
+            for text_content, translated_text in zip(window_texts, translations):
+                for i in unique[text_content]:
+                    logging.debug("Block %d/%d original text: %s", i + 1, total_blocks, text_content)
 
-                if translated_text is None:
-                    print(f"Warning: Translation failed for block {i}, keeping original...")
-                    translated_text = text_content
-                else:
-                    print(f"Translated text: {translated_text}")
+                    if translated_text is None:
+                        # Keep original text if translation fails
+                        logging.warning("Translation failed for block %d, keeping original", i + 1)
+                    else:
+                        logging.debug("Block %d/%d translated text: %s", i + 1, total_blocks, translated_text)
+                        subtitles[i].content = translated_text
+                        record_progress(subtitles[i])
 
-                # Reconstruct block with translation
-                translated_block = f"{subtitle_number}\n{timestamp}\n{translated_text}"
-                translated_blocks.append(translated_block)
+                    # Hand the finished block to the writer
+                    queue.put_nowait((i, subtitles[i]))
 
                 # Show progress
-                progress = (i / total_blocks) * 100
-                print(f"Progress: {progress:.1f}%")
+                progress.update(len(unique[text_content]))
 
+        async def translate_window(n: int, window: List[int]) -> None:
+            # Translate all text contents of the window in a single request
+            window_texts = [texts[j] for j in window]
+            try:
+                translations = await bounded(semaphore, translate_batch(pool, window_texts, cache=cache))
+            except FATAL_API_ERRORS:
+                # A rejected API key fails every window, abort the whole run
+                raise
             except Exception as e:
-                print(f"\nError processing block {i}: {str(e)}")
-                # Keep original block if translation fails
-                translated_blocks.append(block)
-                continue
+                # Original blocks are kept if translation fails
+                logging.error("Error processing batch %d: %s", n, e)
+                translations = [None] * len(window_texts)
+
+            logging.debug("Translated batch %d/%d (%d texts)", n, len(windows), len(window_texts))
+            apply_translations(window_texts, translations)
 
         # Create output directory if it doesn't exist
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        # Write translated content with newline preservation
-        with open(output_path, 'w', encoding='utf-8') as outfile:
-            outfile.write('\n\n'.join(translated_blocks) + '\n')
+        # Blocks are written as soon as they and every block before them are translated.
+        # They go to a temporary file that only replaces the output once complete,
+        # so a crash never leaves a truncated SRT at output_path. Resumable progress
+        # is kept separately in the progress journal, which is only ever appended to
+        tmp_path = output_path + ".tmp"
+        journal_mode = 'a' if resume else 'w'
+        # Log records are routed through tqdm so they do not draw over the progress bar
+        with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 20) as outfile, \
+                open(progress_path, journal_mode, encoding='utf-8') as journal, \
+                logging_redirect_tqdm():
+            writer = asyncio.create_task(write_in_order(outfile, queue, total_blocks))
+            try:
+                if use_batch_api:
+                    apply_translations(texts, await translate_with_batch_api(pool, texts, cache,
+                                                                          output_path + ".batch"))
+
+                # Windows are dispatched together; the semaphore keeps at most
+                # max_concurrency requests in flight and frees a slot as soon as one finishes
+                tasks = [asyncio.create_task(translate_window(n, window))
+                         for n, window in enumerate(windows, 1)]
+                try:
+                    await asyncio.gather(*tasks)
+                finally:
+                    # A fatal error in one window stops the others before they use the key again
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                await writer
+            finally:
+                writer.cancel()
+                progress.close()
+
+        os.replace(tmp_path, output_path)
+        os.remove(progress_path)
 
         print(f"\nTranslation completed successfully!")
         print(f"Translated file saved to: {output_path}")
@@ -102,80 +392,405 @@ def process_srt_file(input_path: str, output_path: str, client: Anthropic) -> bo
         logging.error(f"SRT processing error: {str(e)}")
         return False
 
-def connect_claude_api(api_key: str) -> Optional[Anthropic]:
+def create_http_client() -> DefaultAsyncHttpxClient:
+    """
+    Create the HTTP client shared by every Anthropic client
+
+    Connections are kept alive (the SDK keeps up to 100 idle ones) and
+    multiplexed over HTTP/2, so concurrent requests reuse them instead of
+    paying a TLS handshake each time. The SDK's own client class is used
+    so it matches whichever httpx flavour the installed SDK is built on.
+    """
+    return DefaultAsyncHttpxClient(http2=True)
+
+def connect_claude_api(api_key: str,
+                       http_client: Optional[DefaultAsyncHttpxClient] = None) -> Optional[AsyncAnthropic]:
     """
     Establish connection with Claude API
 
     Args:
         api_key (str): Anthropic API key
+        http_client (Optional[DefaultAsyncHttpxClient]): Shared HTTP client to send requests with
 
     Returns:
-        Optional[anthropic.Anthropic]: Anthropic client object if successful, None if failed
+        Optional[AsyncAnthropic]: Anthropic client object if successful, None if failed
     """
     try:
-        client = Anthropic(api_key=api_key)
+        # create_message owns the retry policy, so the SDK must not retry on its own
+        client = AsyncAnthropic(api_key=api_key, http_client=http_client, max_retries=0)
         return client
     except Exception as e:
         logging.error(f"Failed to connect to Claude API: {str(e)}")
         return None
 
-def translate_text(client: Anthropic, text: str,
-                  max_retries: int = 10, delay: int = 5) -> Optional[str]:
+def get_retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Compute how long to wait before retrying a failed request
+
+    Rate limit responses are honored through their Retry-After header,
+    anything else backs off exponentially with jitter.
+
+    Args:
+        error (Exception): Error raised by the failed request
+        attempt (int): Zero-based number of the failed attempt
+
+    Returns:
+        float: Delay in seconds
+    """
+    if isinstance(error, RateLimitError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) + random.uniform(0, RETRY_BASE_DELAY)
+
+async def create_message(pool: ClientPool, max_retries: int = 10, **params) -> Optional[Message]:
+    """
+    Send a request to Claude API, retrying on failure
+
+    Rate limited requests are retried up to max_retries times, other
+    errors only MAX_ERROR_RETRIES times. Each attempt picks the next
+    available client from the pool, so a rate limited key is skipped
+    while it cools down. Authentication and permission errors are raised
+    since retrying cannot fix them.
+
+    Args:
+        pool (ClientPool): Pool of Anthropic clients
+        max_retries (int): Maximum number of retry attempts
+        **params: Parameters passed to messages.create
+
+    Returns:
+        Optional[Message]: Response message if successful, None if failed
+    """
+    error_retries = 0
+
+    for attempt in range(max_retries):
+        client = pool.next()
+        try:
+            message = await client.messages.create(**params)
+            pool.succeeded(client)
+            return message
+
+        except FATAL_API_ERRORS:
+            raise
+
+        except Exception as e:
+            logging.error(f"Request attempt {attempt + 1} failed: {str(e)}")
+            if isinstance(e, RateLimitError):
+                # Another key may still have capacity, only wait if all are cooling down
+                pool.cool_down(client, get_retry_delay(e, attempt))
+                delay = pool.wait_time()
+            else:
+                error_retries += 1
+                if error_retries > MAX_ERROR_RETRIES:
+                    break
+                # Back off by this error's own retry count, earlier rate limits don't lengthen it
+                delay = get_retry_delay(e, error_retries - 1)
+            if attempt < max_retries - 1:
+                await asyncio.sleep(delay)
+
+    logging.error("Max retries reached. Request failed.")
+    return None
+
+def estimate_max_tokens(text: str, limit: int = 1000) -> int:
+    """
+    Size max_tokens for translating a text instead of always reserving the limit
+
+    Traditional Chinese output is at most about 1.5 tokens per byte of English input.
+
+    Args:
+        text (str): Text to translate
+        limit (int): Upper bound for the estimate
+
+    Returns:
+        int: max_tokens for the request
+    """
+    estimate = max(32, int(len(text.encode('utf-8')) * 1.5))
+    return min(estimate, limit)
+
+def translation_request(text: str) -> dict:
+    """
+    Build the messages.create parameters that translate a single text
+
+    Args:
+        text (str): Text to translate
+
+    Returns:
+        dict: Request parameters
+    """
+    return {
+        "model": MODEL,
+        "max_tokens": estimate_max_tokens(text),
+        "temperature": 0,
+        "system": TRANSLATE_PROMPT,
+        "messages": [
+            {
+                "role": "user",
+                "content": text
+            }
+        ]
+    }
+
+async def translate_text(pool: ClientPool, text: str, max_retries: int = 10,
+                         cache: Optional[TranslationCache] = None) -> Optional[str]:
     """
     Translate text from English to Traditional Chinese using Claude API
 
     Args:
-        client (Anthropic): Anthropic client object
+        pool (ClientPool): Pool of Anthropic clients
         text (str): Text to translate
         max_retries (int): Maximum number of retry attempts
-        delay (int): Delay in seconds between retries
+        cache (Optional[TranslationCache]): Cache checked before calling the API
 
     Returns:
         Optional[str]: Translated text if successful, None if failed
     """
-    # TODO: Add batch processing for better API call optimization
     # TODO: Add custom instructions to improve translation quality
 
-    prompt = f"""Please translate the following English text to Traditional Chinese (zh-tw).
-    Only return the translated text, no explanations or other text.
+    if cache is not None:
+        cached = cache.get(text, MODEL)
+        if cached is not None:
+            return cached
+
+    params = translation_request(text)
+    while True:
+        message = await create_message(pool, max_retries, **params)
+        if message is None:
+            return None
+        if message.stop_reason != "max_tokens":
+            break
 
-    Text: {text}
+        # The estimate was too small, a cut off translation must not be used or cached
+        if params["max_tokens"] >= MAX_OUTPUT_TOKENS:
+            logging.error("Translation was cut off at the output token limit")
+            return None
+        params["max_tokens"] = min(params["max_tokens"] * 2, MAX_OUTPUT_TOKENS)
+        logging.warning(f"Translation was cut off, retrying with max_tokens={params['max_tokens']}")
+
+    translated_text = message.content[0].text
+    if cache is not None:
+        cache.set(text, MODEL, translated_text)
+    return translated_text
+
+async def translate_batch(pool: ClientPool, texts: List[str], max_retries: int = 10,
+                          cache: Optional[TranslationCache] = None) -> List[Optional[str]]:
     """
+    Translate several texts from English to Traditional Chinese with a single API request
 
-    for attempt in range(max_retries):
-        try:
-            message = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=1000,
-                temperature=0,
-                messages=[
+    Falls back to translating each text separately if the response
+    does not contain one translation per text.
+
+    Args:
+        pool (ClientPool): Pool of Anthropic clients
+        texts (List[str]): Texts to translate
+        max_retries (int): Maximum number of retry attempts
+        cache (Optional[TranslationCache]): Cache checked before calling the API
+
+    Returns:
+        List[Optional[str]]: Translated texts in the same order, None for failed items
+    """
+    results = [cache.get(text, MODEL) if cache is not None else None for text in texts]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    # Only texts that are not cached are sent to the API
+    if len(missing) < len(texts):
+        translations = await translate_batch(pool, [texts[i] for i in missing],
+                                             max_retries, cache)
+        for i, translated_text in zip(missing, translations):
+            results[i] = translated_text
+        return results
+
+    if len(texts) == 1:
+        return [await translate_text(pool, texts[0], max_retries, cache)]
+
+    numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(texts, 1))
+
+    message = await create_message(
+        pool,
+        max_retries,
+        model=MODEL,
+        max_tokens=estimate_max_tokens(numbered, MAX_OUTPUT_TOKENS),
+        temperature=0,
+        system=TRANSLATE_BATCH_PROMPT,
+        messages=[
+            {
+                "role": "user",
+                "content": numbered
+            }
+        ]
+    )
+    if message is None:
+        return [None] * len(texts)
+
+    if message.stop_reason == "max_tokens":
+        # The last translations are missing or cut off, translate each text on its own
+        logging.warning(f"Batch of {len(texts)} texts was cut off, retrying items one by one")
+        return [await translate_text(pool, text, max_retries, cache) for text in texts]
+
+    parts = [part.strip() for part in message.content[0].text.split(BATCH_SEPARATOR)]
+    parts = [part for part in parts if part]
+    if len(parts) != len(texts):
+        logging.warning(f"Batch returned {len(parts)} translations for {len(texts)} texts, "
+                        "retrying items one by one")
+        return [await translate_text(pool, text, max_retries, cache) for text in texts]
+
+    # Drop numbering in case the model kept it
+    translations = []
+    for i, part in enumerate(parts, 1):
+        match = NUMBER_PREFIX_RE.match(part)
+        if match and int(match.group(1)) == i:
+            part = part[match.end():]
+        translations.append(part)
+    if cache is not None:
+        cache.set_many(zip(texts, translations), MODEL)
+    return translations
+
+def batch_request_id(text: str) -> str:
+    """
+    Build a Message Batches custom_id that identifies a text across runs
+    """
+    return "txt-" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:40]
+
+async def reattach_batch(pool: ClientPool, state_path: str):
+    """
+    Look up a batch submitted by an earlier run that was interrupted while polling
+
+    Args:
+        pool (ClientPool): Pool of Anthropic clients
+        state_path (str): Path of the file holding the batch id
+
+    Returns:
+        Tuple of the client that owns the batch and the batch, or (None, None)
+    """
+    if not os.path.exists(state_path):
+        return None, None
+
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        client = pool.clients[state["key"]]
+        batch = await client.messages.batches.retrieve(state["id"])
+        return client, batch
+    except FATAL_API_ERRORS:
+        raise
+    except Exception as e:
+        logging.warning(f"Could not reattach to the batch in {state_path}: {str(e)}")
+        return None, None
+
+async def translate_with_batch_api(pool: ClientPool, texts: List[str],
+                                   cache: Optional[TranslationCache] = None,
+                                   state_path: Optional[str] = None) -> List[Optional[str]]:
+    """
+    Translate texts through the Message Batches API
+
+    Batches cost half as much as realtime requests but may take minutes
+    to hours to complete, so this waits for the batch to end. The batch id
+    is kept in state_path until its results are read, so a rerun after an
+    interruption picks up the batch that was already paid for.
+
+    Args:
+        pool (ClientPool): Pool of Anthropic clients
+        texts (List[str]): Texts to translate
+        cache (Optional[TranslationCache]): Cache checked before submitting the batch
+        state_path (Optional[str]): File to remember the submitted batch in
+
+    Returns:
+        List[Optional[str]]: Translated texts in the same order, None for failed items
+    """
+    results = [cache.get(text, MODEL) if cache is not None else None for text in texts]
+    index = {batch_request_id(text): i for i, text in enumerate(texts)}
+
+    client, batch = (None, None) if state_path is None else await reattach_batch(pool, state_path)
+    if batch is not None:
+        tqdm.write(f"Reattached to batch {batch.id} from an earlier run")
+
+    while True:
+        missing = [i for i, result in enumerate(results) if result is None]
+        if batch is None:
+            if not missing:
+                return results
+
+            # The batch has to be polled with the key that created it
+            client = pool.next()
+            batch = await client.messages.batches.create(
+                requests=[
                     {
-                        "role": "user",
-                        "content": prompt
+                        "custom_id": batch_request_id(texts[i]),
+                        "params": translation_request(texts[i])
                     }
+                    for i in missing
                 ]
             )
-            return message.content[0].text
+            if state_path is not None:
+                with open(state_path, 'w', encoding='utf-8') as f:
+                    json.dump({"id": batch.id, "key": pool.clients.index(client)}, f)
+            tqdm.write(f"Submitted batch {batch.id} with {len(missing)} requests")
+            reattached = False
+        else:
+            reattached = True
 
-        except Exception as e:
-            logging.error(f"Translation attempt {attempt + 1} failed: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(delay)
+        while batch.processing_status != "ended":
+            await asyncio.sleep(BATCH_API_POLL_INTERVAL)
+            batch = await client.messages.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            tqdm.write(f"Batch {batch.id}: {batch.processing_status}, "
+                       f"{counts.succeeded + counts.errored + counts.canceled + counts.expired}"
+                       f"/{counts.processing + counts.succeeded + counts.errored + counts.canceled + counts.expired}"
+                       " requests done")
+
+        truncated = []
+        succeeded = []
+        async for entry in await client.messages.batches.results(batch.id):
+            i = index.get(entry.custom_id)
+            if i is None:
+                # Text no longer needs translating since the batch was submitted
                 continue
-            else:
-                logging.error("Max retries reached. Translation failed.")
-                return None
+            if entry.result.type != "succeeded":
+                logging.error(f"Batch request {entry.custom_id} {entry.result.type}")
+                continue
+            if entry.result.message.stop_reason == "max_tokens":
+                logging.warning(f"Batch request {entry.custom_id} was cut off, retrying in realtime")
+                truncated.append(i)
+                continue
+
+            translated_text = entry.result.message.content[0].text
+            results[i] = translated_text
+            succeeded.append((texts[i], translated_text))
 
-def validate_anthropic_key(api_key):
+        if cache is not None:
+            cache.set_many(succeeded, MODEL)
+
+        if state_path is not None and os.path.exists(state_path):
+            os.remove(state_path)
+
+        # translate_text retries with a larger max_tokens until the translation fits
+        for i in truncated:
+            results[i] = await translate_text(pool, texts[i], cache=cache)
+
+        # A reattached batch may not cover every text of this run, submit the rest
+        if not reattached:
+            return results
+        batch = None
+
+async def validate_anthropic_key(client):
     """
-    Validate Anthropic API key by making a test request.
+    Validate the API key of an Anthropic client.
+    Well-formed keys are trusted without a network round trip, auth errors
+    then surface on the first real request. Other keys are checked with a test request.
     Returns True if valid, False otherwise.
     """
+    if API_KEY_RE.fullmatch(client.api_key):
+        return True
+
     try:
-        client = Anthropic(api_key=api_key)
         # Make a minimal test request
-        response = client.messages.create(
-            model="claude-3-haiku-20240307",
+        response = await client.messages.create(
+            model=MODEL,
             max_tokens=1,
             messages=[{
                 "role": "user",
@@ -187,15 +802,21 @@ def validate_anthropic_key(api_key):
         print(f"Error validating API key: {str(e)}")
         return False
 
-def check_anthropic_api_key():
+async def check_anthropic_api_key(http_client=None):
     """
-    Check for Anthropic API key in environment variables.
-    If not found, prompt user to input it and validate.
-    Returns valid API key or None if process is cancelled.
+    Check for Anthropic API keys in environment variables.
+    ANTHROPIC_API_KEYS may hold several comma-separated keys, otherwise
+    ANTHROPIC_API_KEY is used. If none is found, prompt user to input one and validate.
+    Returns list of valid API keys or None if process is cancelled.
     """
     load_dotenv()  # Load existing environment variables
 
-    # Check if API key exists in environment
+    # Several keys spread requests over more rate limit quota
+    api_keys = [key.strip() for key in os.getenv("ANTHROPIC_API_KEYS", "").split(",") if key.strip()]
+    if api_keys:
+        return api_keys
+
+    # Check if API key exists in environment, keys loaded from .env are trusted as is
     api_key = os.getenv("ANTHROPIC_API_KEY")
 
     while not api_key:
@@ -206,18 +827,19 @@ def check_anthropic_api_key():
             return None
 
         # Validate the API key
-        if validate_anthropic_key(api_key):
+        client = connect_claude_api(api_key, http_client)
+        if client and await validate_anthropic_key(client):
             # Save valid key to .env file
             with open(".env", "a") as env_file:
                 env_file.write(f"\nANTHROPIC_API_KEY={api_key}")
             os.environ["ANTHROPIC_API_KEY"] = api_key
-            print("API key validated and saved successfully!")
-            return api_key
+            print("API key accepted and saved. It will be checked on the first translation request.")
+            return [api_key]
         else:
             print("Invalid API key. Please try again.")
             api_key = None
 
-    return api_key
+    return [api_key]
 
 def get_output_filename() -> str:
     """
@@ -271,20 +893,34 @@ def validate_srt_file(file_path):
    # Check file extension
    if not file_path.lower().endswith('.srt'):
        print("Error: File must be an SRT subtitle file (ending with .srt)")
-       return False
+       return None
 
-   # Try to parse the SRT file
+   # Read the file once, decode as UTF-8 and only detect the encoding if that fails
    try:
-       with open(file_path, 'r', encoding='utf-8') as f:
-           content = f.read().strip()
-           if not content:
-               print("Error: SRT file is empty.")
-               return False
-           list(srt.parse(content))
-       return True
+       with open(file_path, 'rb') as f:
+           raw = f.read()
+   except OSError as e:
+       print(f"Error: Could not read the subtitle file: {str(e)}")
+       return None
+
+   try:
+       content = raw.decode('utf-8-sig').strip()
+   except UnicodeDecodeError:
+       match = charset_normalizer.from_bytes(raw).best()
+       if match is None:
+           print("Error: Could not detect the encoding of the subtitle file.")
+           return None
+       content = str(match).strip()
+   if not content:
+       print("Error: SRT file is empty.")
+       return None
+
+   # Try to parse the SRT file, the parsed subtitles are reused for translation
+   try:
+       return list(srt.parse(content))
    except Exception as e:
        print(f"Error: Invalid SRT file format. Please check if the file is a valid subtitle file.")
-       return False
+       return None
 
 def get_input_file():
    # Ask for input file name
@@ -300,46 +936,89 @@ def get_input_file():
    else:
        print(f"File '{file_name}' found in Subs folder.") 
 
-   if file_path and validate_srt_file(file_path):
-       return file_path
+   # Return the parsed subtitles if the file is valid
+   return validate_srt_file(file_path)
 
-   return None
+def positive_int(value: str) -> int:
+    """
+    Parse a command line value that must be an integer of at least 1
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
 
-def main():
+def parse_args() -> argparse.Namespace:
+    """
+    Parse command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Translate English SRT subtitles to Traditional Chinese")
+    parser.add_argument("--max-concurrency", type=positive_int, default=MAX_CONCURRENCY,
+                        help=f"Maximum number of API requests in flight (default: {MAX_CONCURRENCY})")
+    parser.add_argument("--mode", choices=["realtime", "batch"], default="realtime",
+                        help="Translate with realtime requests or, for large files, the cheaper "
+                             "but slower Message Batches API (default: realtime)")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="Translate every block again instead of resuming an interrupted run")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help=f"Path to the translation cache database (default: {DEFAULT_CACHE_PATH})")
+    return parser.parse_args()
+
+async def run(args: argparse.Namespace):
+    async with create_http_client() as http_client:
+        await translate_subtitles(args, http_client)
 
+async def translate_subtitles(args: argparse.Namespace, http_client: DefaultAsyncHttpxClient):
     # check the api key exist in the environment variable
     # if not, ask user to input the api key, if the api key is valid, save it to the environment variable
     # if the api key is invalid, ask user to input again
     # validate the api key by connection test
-    check_anthropic_api_key() 
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if api_key:
-        print("Anthropic API key found.")
+    api_keys = await check_anthropic_api_key(http_client)
+    if api_keys:
+        print(f"Anthropic API key found ({len(api_keys)} key(s)).")
     else:
         print("Anthropic API key not found, please try another.")
+        return
 
     # User input the file name
     # a. check the file name under Subs folder 
     # b. check if it is a valid file
-    file_path = get_input_file()
+    subtitles = get_input_file()
 
-    if file_path is None:
+    if subtitles is None:
         print("Exiting due to invalid input file.")
         return
 
     # ask user for the output file name
-    output_path = get_output_filename ()
-    # if not, ask user to input the api key, if the api key is valid, save it to the environment variable
-    # if the api key is invalid, ask user to input again
-    # validate the api key by connection test
-    client = connect_claude_api(api_key)
+    output_path = get_output_filename()
 
-    success = process_srt_file(file_path, output_path, client)
+    # one client per api key, all sharing the same connection pool
+    clients = [connect_claude_api(api_key, http_client) for api_key in api_keys]
+    clients = [client for client in clients if client is not None]
+    if not clients:
+        print("Could not create an Anthropic client for any API key. Exiting.")
+        return
+    pool = ClientPool(clients)
+
+    cache = TranslationCache(args.cache)
+    try:
+        success = await process_srt_file(subtitles, output_path, pool,
+                                         max_concurrency=args.max_concurrency,
+                                         cache=cache,
+                                         mode=args.mode,
+                                         resume=args.resume)
+    finally:
+        cache.close()
     if success:
         print("File processed successfully")
     else:
         print("Error processing file")
 
 
+def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+    asyncio.run(run(parse_args()))
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,81 @@
+import hashlib
+import sqlite3
+import time
+from typing import Iterable, Optional, Tuple
+
+# Bump the version whenever prompts or the stored format change so old entries are ignored
+CACHE_VERSION = "v2"
+TARGET_LANGUAGE = "zh-tw"
+DEFAULT_CACHE_PATH = "translations.db"
+
+
+class TranslationCache:
+    """
+    Persistent translation cache stored in a SQLite database
+
+    Entries are keyed by the cache version, model, target language and source
+    text, so translations are reused across runs and files.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        Open (and create if needed) the cache database
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations "
+            "(hash TEXT PRIMARY KEY, text TEXT, ts INTEGER)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """
+        Build the cache key for a source text translated with the given model
+        """
+        digest = hashlib.sha256(f"{model}|{TARGET_LANGUAGE}|{text}".encode("utf-8")).hexdigest()
+        return f"{CACHE_VERSION}:{digest}"
+
+    def get(self, text: str, model: str) -> Optional[str]:
+        """
+        Look up a cached translation
+
+        Returns:
+            Optional[str]: Cached translation if found, None otherwise
+        """
+        row = self.conn.execute(
+            "SELECT text FROM translations WHERE hash=?",
+            (self.make_key(text, model),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, text: str, model: str, translation: str) -> None:
+        """
+        Store a translation in the cache
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO translations (hash, text, ts) VALUES (?, ?, ?)",
+            (self.make_key(text, model), translation, int(time.time()))
+        )
+        self.conn.commit()
+
+    def set_many(self, items: Iterable[Tuple[str, str]], model: str) -> None:
+        """
+        Store several (text, translation) pairs in the cache with a single commit
+        """
+        ts = int(time.time())
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO translations (hash, text, ts) VALUES (?, ?, ?)",
+            [(self.make_key(text, model), translation, ts) for text, translation in items]
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        """
+        Close the database connection
+        """
+        self.conn.close()